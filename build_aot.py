@@ -0,0 +1,23 @@
+from numba.pycc import CC
+
+import traj_tools
+
+# Ahead-of-time compile the hot single-structure kernels into a traj_tools_aot
+# extension module.  Run `python build_aot.py` once per environment; traj_tools
+# picks the precompiled kernels up automatically and skips their JIT cost.
+# Kernels that are called from inside other jitted functions keep their numba
+# dispatchers in traj_tools so the nopython call graph still links against them;
+# only standalone entry points are exported here.  The _jit_* aliases point at
+# the dispatchers even when a previously built extension is already loaded.
+
+cc = CC('traj_tools_aot')
+
+cc.export('sample_variance', 'f8(f8[:], f8)')(traj_tools._jit_sample_variance.py_func)
+cc.export('rmsd_kabsch', 'f8(f8[:,:], f8[:,:])')(traj_tools._jit_rmsd_kabsch.py_func)
+cc.export('weight_kabsch_rmsd', 'f8(f8[:,:], f8[:,:], f8[:,:])')(traj_tools._jit_weight_kabsch_rmsd.py_func)
+cc.export('weight_kabsch_dist_align', 'f8(f8[:,:], f8[:,:], f8[:,:])')(traj_tools._jit_weight_kabsch_dist_align.py_func)
+cc.export('weight_kabsch_dist_lowrank', 'f8(f8[:,:], f8[:,:], f8[:,:], f8[:])')(traj_tools._jit_weight_kabsch_dist_lowrank.py_func)
+cc.export('qcp_rotate', 'f8[:,:](f8[:,:], f8[:,:])')(traj_tools._jit_qcp_rotate.py_func)
+
+if __name__ == '__main__':
+    cc.compile()
@@ -1,83 +1,101 @@
 import numpy as np
 import numba
-from numba import jit
+from numba import jit, prange
+from scipy.linalg.blas import dsyrk
 
 NumericThresh = 1E-150
 LogNumericThresh = np.log(NumericThresh)
 EigenValueThresh = 1E-10
+# frames per block for the chunked trajectory reductions; bounds displacement
+# temporaries to ChunkFrames*n_atoms*3 elements regardless of trajectory length
+ChunkFrames = 4096
 
 ###########################################################################################################
 ##################################   General Utilities  ########################################
 ###########################################################################################################
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def sample_variance(zeroMeanDataArray,norm):
     """
     Compute the variance of a zero meaned array.  Divide by normalization factor.
     zero_mean_data_array    (required)  : float64 array of data
     norm                    (required)  : float64 value to divide variance by - supplied so one can substract appropriate values etc from normalization
     """
-    # meta data from array
-    nDataPoints = zeroMeanDataArray.shape[0]
-    # zero variance
-    var = np.float64(0.0)
-    for i in range(nDataPoints):
-        var += zeroMeanDataArray[i]**2
+    # sum of squares in one ddot call
+    var = np.dot(zeroMeanDataArray,zeroMeanDataArray)
     return var/norm
 
 # compute the covariance from trajectory data
 # we assume the trajectory is aligned here
-@jit(nopython=True)
 def covar_3Nx3N_from_traj(traj_positions):
     # trajectory metadata
     n_frames = traj_positions.shape[0]
     n_atoms = traj_positions.shape[1]
     n_dim = traj_positions.shape[2]
-    # Initialize average and covariance arrays
-    avg = np.zeros((n_atoms*n_dim))
-    covar = np.zeros((n_atoms*n_dim,n_atoms*n_dim))
-    # loop over trajectory and compute average and covariance
-    for ts in range(n_frames):
-        flat = traj_positions[ts].flatten()
-        avg += flat
-        covar += np.outer(flat,flat)
-    # finish averages
-    avg /= n_frames
+    # flatten each frame so the sum of per-frame outer products becomes one matrix product
+    flat_traj = traj_positions.reshape(n_frames,n_atoms*n_dim)
+    avg = flat_traj.mean(axis=0)
+    # single rank-n_frames update (BLAS gemm) instead of n_frames rank-1 updates
+    covar = np.dot(flat_traj.T,flat_traj)
     covar /= n_frames-1
     # finish covar
     covar -= np.outer(avg,avg)
     return covar
 
-@jit(nopython=True)
+# covariance from displacements already stacked as (3*n_frames, n_atoms); the
+# component-major driver buffers provide this shape as a zero-copy view
+def _covar_NxN_from_stacked(disp, n_frames):
+    # single syrk fills the upper triangle of disp.T @ disp, averaged
+    covar = dsyrk(alpha=1.0/(3*(n_frames-1)),a=disp,trans=1)
+    # mirror the upper triangle into the lower
+    covar = covar + covar.T - np.diag(np.diag(covar))
+    # done, return
+    return covar
+
+# covariance accumulated chunk-by-chunk from a component-major (n_frames, 3,
+# n_atoms) trajectory so the displacement temporary never spans the whole
+# trajectory; each block feeds one accumulating syrk
+def _covar_NxN_chunked(aligned_cm, avg, chunk=ChunkFrames):
+    # meta data
+    n_frames = aligned_cm.shape[0]
+    n_atoms = aligned_cm.shape[2]
+    covar = np.zeros((n_atoms,n_atoms),order='F')
+    for start in range(0,n_frames,chunk):
+        d = (aligned_cm[start:start+chunk] - avg).reshape(-1,n_atoms)
+        covar = dsyrk(alpha=1.0,a=d,trans=1,beta=1.0,c=covar,overwrite_c=1)
+    covar /= 3*(n_frames-1)
+    # mirror the upper triangle into the lower
+    covar = covar + covar.T - np.diag(np.diag(covar))
+    # done, return
+    return covar
+
 def covar_NxN_from_traj(traj_disp):
     # trajectory metadata
     n_frames = traj_disp.shape[0]
     n_atoms = traj_disp.shape[1]
-    # declare covar
-    covar = np.zeros((n_atoms,n_atoms),np.float64)
-    # loop and compute
-    for ts in range(n_frames):
-        covar += np.dot(traj_disp[ts],traj_disp[ts].T)
-    # symmetrize and average covar
-    covar /= 3*(n_frames-1)
-    # done, return
-    return covar
+    # gather the frame and dimension axes so all frames feed one symmetric rank-k update
+    disp = traj_disp.transpose(0,2,1).reshape(n_frames*3,n_atoms)
+    return _covar_NxN_from_stacked(disp, n_frames)
 
-@jit(nopython=True)
 def pseudo_lpdet_inv(sigma):
-    N = sigma.shape[0]
-    e, v = np.linalg.eigh(sigma)
-    precision = np.zeros(sigma.shape,dtype=np.float64)
-    lpdet = 0.0
-    rank = 0
-    for i in range(N):
-        if (e[i] > EigenValueThresh):
-            lpdet += np.log(e[i])
-            precision += 1.0/e[i]*np.outer(v[:,i],v[:,i])
-            rank += 1
+    lpdet, V_kept, inv_e, rank = pseudo_lpdet_eig(sigma)
+    # one gemm over the kept eigenvectors instead of rank-1 updates per eigenvalue
+    precision = np.dot(V_kept*inv_e, V_kept.T)
     return lpdet, precision, rank
 
-@jit(nopython=True)
+# eigendecomposition form of pseudo_lpdet_inv: return the kept eigenvectors and
+# inverse eigenvalues instead of materializing the NxN precision matrix, so
+# quadratic forms can be evaluated as O(N*rank) projections
+def pseudo_lpdet_eig(sigma):
+    e, v = np.linalg.eigh(sigma)
+    keep = e > EigenValueThresh
+    V_kept = v[:,keep]
+    inv_e = 1.0/e[keep]
+    lpdet = np.sum(np.log(e[keep]))
+    rank = V_kept.shape[1]
+    return lpdet, V_kept, inv_e, rank
+
+@jit(nopython=True, cache=True)
 def lpdet_inv(sigma):
     N = sigma.shape[0]
     e, v = np.linalg.eigh(sigma)
@@ -92,7 +110,7 @@ def lpdet_inv(sigma):
 ###########################################################################################################
 
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def weight_kabsch_dist_align(x1, x2, weights):
     """
     Compute the Mahalabonis distance between positions x1 and x2 after aligned x1 to x2 given Kabsch weights (inverse variance)
@@ -101,13 +119,9 @@ def weight_kabsch_dist_align(x1, x2, weights):
     weights                 (required)  : float64 matrix with dimensions (n_atoms, n_atoms) of inverse (n_atoms, n_atoms) covariance
     """    
     x1_prime = weight_kabsch_rotate(x1, x2, weights)
-    dist = 0.0
-    for i in range(3):
-        disp = x1_prime[:,i] - x2[:,i]
-        dist += np.dot(disp,np.dot(weights,disp))
-    return dist
+    return weight_kabsch_dist(x1_prime, x2, weights)
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def weight_kabsch_dist(x1, x2, weights):
     """
     Compute the Mahalabonis distance between positions x1 and x2 given Kabsch weights (inverse variance)
@@ -115,13 +129,27 @@ def weight_kabsch_dist(x1, x2, weights):
     x2                      (required)  : float64 array with dimensions (n_atoms,3) of another molecular configuration
     weights                 (required)  : float64 matrix with dimensions (n_atoms, n_atoms) of inverse (n_atoms, n_atoms) covariance
     """    
-    dist = 0.0
-    for i in range(3):
-        disp = x1[:,i] - x2[:,i]
-        dist += np.dot(disp,np.dot(weights,disp))
+    disp = x1 - x2
+    # one (3,N)(N,N)(N,3) product instead of three separate per-axis matvecs
+    dist = np.trace(np.dot(np.dot(disp.T,weights),disp))
+    return dist
+
+@jit(nopython=True, cache=True)
+def weight_kabsch_dist_lowrank(x1, x2, V_kept, inv_e):
+    """
+    Compute the Mahalabonis distance between positions x1 and x2 given the precision in factored eigen form (see pseudo_lpdet_eig)
+    x1                      (required)  : float64 array with dimensions (n_atoms,3) of one molecular configuration
+    x2                      (required)  : float64 array with dimensions (n_atoms,3) of another molecular configuration
+    V_kept                  (required)  : float64 array with dimensions (n_atoms, rank) of kept covariance eigenvectors
+    inv_e                   (required)  : float64 array with dimensions (rank) of inverse covariance eigenvalues
+    """
+    disp = x1 - x2
+    # project onto the kept eigenvectors: O(N*rank) instead of O(N^2)
+    proj = np.dot(V_kept.T,disp)
+    dist = np.dot((proj*proj).sum(axis=1),inv_e)
     return dist
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def weight_kabsch_rotate(mobile, target, weights):
     correlation_matrix = np.dot(np.transpose(mobile), np.dot(weights, target))
     V, S, W_tr = np.linalg.svd(correlation_matrix)
@@ -131,21 +159,21 @@ def weight_kabsch_rotate(mobile, target, weights):
     mobile_prime = np.dot(mobile,rotation)
     return mobile_prime
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def weight_kabsch_rmsd(mobile, target, weights):
     xyz1_prime = weight_kabsch_rotate(mobile, target, weights)
     delta = xyz1_prime - target
     rmsd = (delta ** 2.0).sum(1).mean() ** 0.5
     return rmsd
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def rmsd_kabsch(xyz1, xyz2):
     xyz1_prime = kabsch_rotate(xyz1, xyz2)
     delta = xyz1_prime - xyz2
     rmsd = (delta ** 2.0).sum(1).mean() ** 0.5
     return rmsd
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def kabsch_rotate(mobile, target):
     correlation_matrix = np.dot(np.transpose(mobile), target)
     V, S, W_tr = np.linalg.svd(correlation_matrix)
@@ -155,14 +183,227 @@ def kabsch_rotate(mobile, target):
     mobile_prime = np.dot(mobile,rotation) 
     return mobile_prime
 
-@jit(nopython=True)
+# optimal rotation for a 3x3 correlation matrix via SVD; fallback for
+# correlation matrices too degenerate for the QCP Newton iteration
+@jit(nopython=True, cache=True)
+def _svd_rotation(correlation_matrix):
+    V, S, W_tr = np.linalg.svd(correlation_matrix)
+    if np.linalg.det(V) * np.linalg.det(W_tr) < 0.0:
+        V[:, -1] = -V[:, -1]
+    return np.dot(V, W_tr)
+
+# compute the optimal rotation for a 3x3 correlation matrix with Theobald's
+# quaternion characteristic polynomial (QCP) method: Newton iterate for the
+# largest eigenvalue of the 4x4 key matrix, then read the rotation quaternion
+# off the adjugate of K - lambda*I.  No SVD / LAPACK call per frame.
+@jit(nopython=True, cache=True, fastmath=True)
+def qcp_rotation(correlation_matrix, e0):
+    Sxx = correlation_matrix[0,0]
+    Sxy = correlation_matrix[0,1]
+    Sxz = correlation_matrix[0,2]
+    Syx = correlation_matrix[1,0]
+    Syy = correlation_matrix[1,1]
+    Syz = correlation_matrix[1,2]
+    Szx = correlation_matrix[2,0]
+    Szy = correlation_matrix[2,1]
+    Szz = correlation_matrix[2,2]
+    Sxx2 = Sxx*Sxx
+    Syy2 = Syy*Syy
+    Szz2 = Szz*Szz
+    Sxy2 = Sxy*Sxy
+    Syx2 = Syx*Syx
+    Sxz2 = Sxz*Sxz
+    Szx2 = Szx*Szx
+    Syz2 = Syz*Syz
+    Szy2 = Szy*Szy
+    # (near-)rank-1 correlation matrices -- collinear structures -- make the
+    # largest key-matrix eigenvalue a (near-)double root that coincides with
+    # the Newton seed e0, so the iteration divides 0/0 or converges to the
+    # wrong root; detect them from the adjugate norm (~(s1*s2)^2) against the
+    # squared Frobenius norm (~s1^2) and solve those by SVD instead
+    fro2 = Sxx2 + Syy2 + Szz2 + Sxy2 + Syx2 + Sxz2 + Szx2 + Syz2 + Szy2
+    adj2 = ((Syy*Szz - Syz*Szy)**2 + (Syx*Szz - Syz*Szx)**2 + (Syx*Szy - Syy*Szx)**2
+            + (Sxy*Szz - Sxz*Szy)**2 + (Sxx*Szz - Sxz*Szx)**2 + (Sxx*Szy - Sxy*Szx)**2
+            + (Sxy*Syz - Sxz*Syy)**2 + (Sxx*Syz - Sxz*Syx)**2 + (Sxx*Syy - Sxy*Syx)**2)
+    if adj2 <= 1e-12*fro2*fro2:
+        return _svd_rotation(correlation_matrix)
+    # coefficients of the quartic characteristic polynomial (Theobald 2005)
+    SyzSzymSyySzz2 = 2.0*(Syz*Szy - Syy*Szz)
+    Sxx2Syy2Szz2Syz2Szy2 = Syy2 + Szz2 - Sxx2 + Syz2 + Szy2
+    C2 = -2.0*(Sxx2 + Syy2 + Szz2 + Sxy2 + Syx2 + Sxz2 + Szx2 + Syz2 + Szy2)
+    C1 = 8.0*(Sxx*Syz*Szy + Syy*Szx*Sxz + Szz*Sxy*Syx - Sxx*Syy*Szz - Syz*Szx*Sxy - Szy*Syx*Sxz)
+    SxzpSzx = Sxz + Szx
+    SyzpSzy = Syz + Szy
+    SxypSyx = Sxy + Syx
+    SyzmSzy = Syz - Szy
+    SxzmSzx = Sxz - Szx
+    SxymSyx = Sxy - Syx
+    SxxpSyy = Sxx + Syy
+    SxxmSyy = Sxx - Syy
+    Sxy2Sxz2Syx2Szx2 = Sxy2 + Sxz2 - Syx2 - Szx2
+    C0 = (Sxy2Sxz2Syx2Szx2*Sxy2Sxz2Syx2Szx2
+          + (Sxx2Syy2Szz2Syz2Szy2 + SyzSzymSyySzz2)*(Sxx2Syy2Szz2Syz2Szy2 - SyzSzymSyySzz2)
+          + (-SxzpSzx*SyzmSzy + SxymSyx*(SxxmSyy - Szz))*(-SxzmSzx*SyzpSzy + SxymSyx*(SxxmSyy + Szz))
+          + (-SxzpSzx*SyzpSzy - SxypSyx*(SxxpSyy - Szz))*(-SxzmSzx*SyzmSzy - SxypSyx*(SxxpSyy + Szz))
+          + (SxypSyx*SyzpSzy + SxzpSzx*(SxxmSyy + Szz))*(-SxymSyx*SyzmSzy + SxzpSzx*(SxxpSyy + Szz))
+          + (SxypSyx*SyzmSzy + SxzmSzx*(SxxmSyy - Szz))*(-SxymSyx*SyzpSzy + SxzmSzx*(SxxpSyy - Szz)))
+    # Newton iteration from e0 (an upper bound) converges in a handful of steps
+    mxEigenV = e0
+    for _ in range(50):
+        oldg = mxEigenV
+        x2 = mxEigenV*mxEigenV
+        b = (x2 + C2)*mxEigenV
+        a = b + C1
+        den = 2.0*x2*mxEigenV + b + a
+        if den == 0.0:
+            # stationary point of the quartic: Newton cannot proceed
+            return _svd_rotation(correlation_matrix)
+        delta = (a*mxEigenV + C0)/den
+        mxEigenV -= delta
+        if np.abs(mxEigenV - oldg) < np.abs(1e-11*mxEigenV):
+            break
+    # quaternion from the adjugate of K - lambda*I
+    a11 = SxxpSyy + Szz - mxEigenV
+    a12 = SyzmSzy
+    a13 = -SxzmSzx
+    a14 = SxymSyx
+    a21 = SyzmSzy
+    a22 = SxxmSyy - Szz - mxEigenV
+    a23 = SxypSyx
+    a24 = SxzpSzx
+    a31 = a13
+    a32 = a23
+    a33 = Syy - Sxx - Szz - mxEigenV
+    a34 = SyzpSzy
+    a41 = a14
+    a42 = a24
+    a43 = a34
+    a44 = Szz - SxxpSyy - mxEigenV
+    a3344_4334 = a33*a44 - a43*a34
+    a3244_4234 = a32*a44 - a42*a34
+    a3243_4233 = a32*a43 - a42*a33
+    a3143_4133 = a31*a43 - a41*a33
+    a3144_4134 = a31*a44 - a41*a34
+    a3142_4132 = a31*a42 - a41*a32
+    q1 =  a22*a3344_4334 - a23*a3244_4234 + a24*a3243_4233
+    q2 = -a21*a3344_4334 + a23*a3144_4134 - a24*a3143_4133
+    q3 =  a21*a3244_4234 - a22*a3144_4134 + a24*a3142_4132
+    q4 = -a21*a3243_4233 + a22*a3143_4133 - a23*a3142_4132
+    qsqr = q1*q1 + q2*q2 + q3*q3 + q4*q4
+    evecprec = 1e-6
+    if qsqr < evecprec:
+        # near-degenerate: try the remaining adjugate rows before giving up
+        q1 =  a12*a3344_4334 - a13*a3244_4234 + a14*a3243_4233
+        q2 = -a11*a3344_4334 + a13*a3144_4134 - a14*a3143_4133
+        q3 =  a11*a3244_4234 - a12*a3144_4134 + a14*a3142_4132
+        q4 = -a11*a3243_4233 + a12*a3143_4133 - a13*a3142_4132
+        qsqr = q1*q1 + q2*q2 + q3*q3 + q4*q4
+        if qsqr < evecprec:
+            a1324_1423 = a13*a24 - a14*a23
+            a1224_1422 = a12*a24 - a14*a22
+            a1223_1322 = a12*a23 - a13*a22
+            a1124_1421 = a11*a24 - a14*a21
+            a1123_1321 = a11*a23 - a13*a21
+            a1122_1221 = a11*a22 - a12*a21
+            q1 =  a42*a1324_1423 - a43*a1224_1422 + a44*a1223_1322
+            q2 = -a41*a1324_1423 + a43*a1124_1421 - a44*a1123_1321
+            q3 =  a41*a1224_1422 - a42*a1124_1421 + a44*a1122_1221
+            q4 = -a41*a1223_1322 + a42*a1123_1321 - a43*a1122_1221
+            qsqr = q1*q1 + q2*q2 + q3*q3 + q4*q4
+            if qsqr < evecprec:
+                q1 =  a32*a1324_1423 - a33*a1224_1422 + a34*a1223_1322
+                q2 = -a31*a1324_1423 + a33*a1124_1421 - a34*a1123_1321
+                q3 =  a31*a1224_1422 - a32*a1124_1421 + a34*a1122_1221
+                q4 = -a31*a1223_1322 + a32*a1123_1321 - a33*a1122_1221
+                qsqr = q1*q1 + q2*q2 + q3*q3 + q4*q4
+                if qsqr < evecprec:
+                    # structures already coincide
+                    return np.eye(3)
+    normq = np.sqrt(qsqr)
+    q1 /= normq
+    q2 /= normq
+    q3 /= normq
+    q4 /= normq
+    # quaternion to rotation matrix
+    a2 = q1*q1
+    x2 = q2*q2
+    y2 = q3*q3
+    z2 = q4*q4
+    xy = q2*q3
+    az = q1*q4
+    zx = q4*q2
+    ay = q1*q3
+    yz = q3*q4
+    ax = q1*q2
+    rotation = np.empty((3,3),dtype=np.float64)
+    rotation[0,0] = a2 + x2 - y2 - z2
+    rotation[0,1] = 2.0*(xy + az)
+    rotation[0,2] = 2.0*(zx - ay)
+    rotation[1,0] = 2.0*(xy - az)
+    rotation[1,1] = a2 - x2 + y2 - z2
+    rotation[1,2] = 2.0*(yz + ax)
+    rotation[2,0] = 2.0*(zx + ay)
+    rotation[2,1] = 2.0*(yz - ax)
+    rotation[2,2] = a2 - x2 - y2 + z2
+    return rotation
+
+@jit(nopython=True, cache=True)
+def qcp_rotate(mobile, target):
+    """
+    Rotate mobile onto target using the QCP algorithm.  Produces the same proper rotation as kabsch_rotate without a per-call SVD.
+    mobile                  (required)  : float64 array with dimensions (n_atoms,3) of the configuration to rotate
+    target                  (required)  : float64 array with dimensions (n_atoms,3) of the configuration to align to
+    """
+    # the 3x3 solve always runs in float64 even for float32 coordinates
+    correlation_matrix = np.dot(np.transpose(mobile), target).astype(np.float64)
+    e0 = 0.5*(np.float64((mobile*mobile).sum()) + np.float64((target*target).sum()))
+    rotation = qcp_rotation(correlation_matrix, e0)
+    mobile_prime = np.dot(mobile,rotation.astype(mobile.dtype))
+    return mobile_prime
+
+# solve and apply the per-frame QCP rotations given precomputed correlation
+# matrices; frames are independent so the loop is parallel over threads.
+# aligned_cm is component-major: (n_frames, 3, n_atoms)
+@jit(nopython=True, parallel=True, cache=True)
+def _apply_qcp_rotations(aligned_cm, correlation_matrices, e0s):
+    # trajectory metadata
+    n_frames = aligned_cm.shape[0]
+    n_dim = aligned_cm.shape[1]
+    n_atoms = aligned_cm.shape[2]
+    new_avg = np.zeros((n_dim,n_atoms),dtype=np.float64)
+    for ts in prange(n_frames):
+        rotation = qcp_rotation(correlation_matrices[ts], e0s[ts])
+        # component-major frames rotate from the left with the transpose
+        aligned_cm[ts] = np.dot(rotation.T.astype(aligned_cm.dtype), aligned_cm[ts])
+        new_avg += aligned_cm[ts]
+    # finish average
+    new_avg /= n_frames
+    return new_avg
+
+# rotate every frame of a component-major trajectory onto a common component-major
+# target and return the new average
+def _align_frames_to_target(aligned_cm, target):
+    # trajectory metadata
+    n_frames = aligned_cm.shape[0]
+    n_atoms = aligned_cm.shape[2]
+    # the target is shared by every frame, so all correlation matrices come from
+    # one gemm against the stacked frame/Cartesian axes; in component-major layout
+    # the stack is a zero-copy view
+    correlation_matrices = np.dot(aligned_cm.reshape(n_frames*3,n_atoms),
+                                  target.T).reshape(n_frames,3,3).astype(np.float64, copy=False)
+    # per-frame upper bounds on the maximum key-matrix eigenvalue seed the Newton solves
+    e0s = 0.5*(np.einsum('fia,fia->f',aligned_cm,aligned_cm,dtype=np.float64)
+               + np.float64((target*target).sum()))
+    return _apply_qcp_rotations(aligned_cm, correlation_matrices, e0s)
+
+@jit(nopython=True, cache=True)
 def kabsch_transform(mobile, target):
     translation, rotation = compute_translation_and_rotation(mobile, target)
     #mobile_prime = mobile.dot(rotation) + translation
     mobile_prime = np.dot(mobile,rotation) #+ translation
     return mobile_prime
 
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def compute_translation_and_rotation(mobile, target):
     #meta data
     n_atoms = mobile.shape[0]
@@ -193,56 +434,114 @@ def compute_translation_and_rotation(mobile, target):
 ##################################   Uniform Covariance Model      ########################################
 ###########################################################################################################
 
-@jit(nopython=True)
+# total squared displacement about avg, accumulated chunk-by-chunk
+def _sum_sq_disp_cm(aligned_cm, avg, chunk=ChunkFrames):
+    ss = 0.0
+    for start in range(0,aligned_cm.shape[0],chunk):
+        d = aligned_cm[start:start+chunk] - avg
+        ss += np.einsum('fda,fda->',d,d,dtype=np.float64)
+    return ss
+
+# log likelihood and sample variance from the total squared displacement.
+# ss/sampleVar is (n_frames-1)*3*(n_atoms-1) by construction, so the quadratic
+# term of the log likelihood is a constant and only the log survives
+def _uniform_log_lik_from_ss(ss, n_frames, n_atoms):
+    sampleVar = ss / ((n_frames-1)*3*(n_atoms-1))
+    log_lik = -0.5 * ((n_frames-1)*3*(n_atoms-1) + n_frames*3*(n_atoms-1)*np.log(sampleVar))
+    return log_lik, sampleVar
+
 def uniform_kabsch_log_lik(x, mu):
     # meta data
     n_frames = x.shape[0]
     n_atoms = x.shape[1]
-    # compute log Likelihood for all points
-    log_lik = 0.0
-    sampleVar = 0.0
-    for i in range(n_frames):
-        for j in range(3):
-            disp = x[i,:,j] - mu[:,j]
-            temp = np.dot(disp,disp)
-            sampleVar += temp
-            log_lik += temp
-    # finish variance
-    sampleVar /= (n_frames-1)*3*(n_atoms-1)
-    log_lik /= sampleVar
-    log_lik +=  n_frames * 3 * (n_atoms-1) * np.log(sampleVar)
-    log_lik *= -0.5
-    return log_lik, sampleVar
+    # single fused reduction over the whole trajectory; no squared temporary
+    disp = x - mu
+    return _uniform_log_lik_from_ss(np.einsum('fad,fad->',disp,disp,dtype=np.float64), n_frames, n_atoms)
+
+# component-major core of align_maximum_likelihood_uniform; works on and returns
+# (n_frames, 3, n_atoms) buffers so the other drivers can stay in that layout
+def _align_maximum_likelihood_uniform_cm(traj_positions, thresh, max_steps, silent, dtype):
+    # trajectory metadata
+    n_frames = traj_positions.shape[0]
+    n_atoms = traj_positions.shape[1]
+    # working copy in component-major layout: each Cartesian slice is contiguous
+    # across atoms, so stacked (3*n_frames, n_atoms) views below are zero-copy
+    aligned_cm = np.ascontiguousarray(traj_positions.astype(dtype).transpose(0,2,1))
+    # start be removing COG translation; means accumulate in float64
+    aligned_cm -= aligned_cm.mean(axis=2,keepdims=True,dtype=np.float64)
+    # Initialize average as first frame; averages stay float64
+    avg = aligned_cm[0].astype(np.float64)
+    log_lik, var = _uniform_log_lik_from_ss(_sum_sq_disp_cm(aligned_cm, avg), n_frames, n_atoms)
+    # perform iterative alignment and average to converge log likelihood
+    log_lik_diff = 10
+    step = 1
+    if silent == False:
+        print("Iteration   Log Likelihood     Delta Log Likelihood")
+        print("-----------------------------------------------------------------")
+    while log_lik_diff > thresh and step < max_steps:
+        # align trajectory to average and accumulate new average
+        new_avg = _align_frames_to_target(aligned_cm, avg)
+        # compute log likelihood about the updated average
+        new_log_lik, var = _uniform_log_lik_from_ss(_sum_sq_disp_cm(aligned_cm, new_avg), n_frames, n_atoms)
+        log_lik_diff = np.abs(new_log_lik-log_lik)
+        log_lik = new_log_lik
+        # copy new average
+        avg = np.copy(new_avg)
+        step += 1
+        if silent == False:
+            print(step, log_lik, log_lik_diff)
+    return aligned_cm, avg, var
 
-@jit(nopython=True)
-def align_maximum_likelihood_uniform(traj_positions,thresh=1E-10, max_steps=300, silent=False):
+def align_maximum_likelihood_uniform(traj_positions,thresh=1E-10, max_steps=300, silent=False, dtype=np.float64):
     """
     Perform maximum likelihood alignment of a trajecotry of particle positions.  The alignment is done with the uniform covariance model.  This model assumes that particles vary in equivalent, independent, spherical distributions.
     Inputs:
        traj_positions          (required)  : float64 array with dimensions (n_frames, n_atoms, 3) of particle positions
        thresh             (default: 1e-3)  : float64 scalar determining the log likelihood difference deemed to be converged
        max_steps           (default: 300)  : int scalar capping the number of iterations attempted if convergence criteria is not met
+       dtype      (default: np.float64)    : numpy dtype for the working copy of the trajectory; np.float32 halves memory traffic while averages and likelihoods are still accumulated in float64
+    Outputs:
+       aligned_positions                   : float64 array with dimensions (n_frames, n_atoms, 3) of aligned particle positions
+       avg                                 : float64 array with dimensions (n_atoms, 3) of the average structure after alignment
+       particle_variance                   : float64 scalar of average particle variance after alignment
+    """
+    aligned_cm, avg, var = _align_maximum_likelihood_uniform_cm(traj_positions, thresh, max_steps, silent, dtype)
+    # back to (n_frames, n_atoms, 3) for the caller
+    return np.ascontiguousarray(aligned_cm.transpose(0,2,1)), np.ascontiguousarray(avg.T), var
+
+def align_maximum_likelihood_uniform_gpu(traj_positions,thresh=1E-10, max_steps=300, silent=False, dtype=np.float64):
+    """
+    GPU port of align_maximum_likelihood_uniform using CuPy.  The trajectory is uploaded to the device once, every iteration runs as batched kernels (correlation matrices, 3x3 SVDs, rotations, reductions) and only the final arrays are copied back.  Requires CuPy; inputs and outputs match align_maximum_likelihood_uniform.
+    Inputs:
+       traj_positions          (required)  : float64 array with dimensions (n_frames, n_atoms, 3) of particle positions
+       thresh             (default: 1e-10) : float64 scalar determining the log likelihood difference deemed to be converged
+       max_steps           (default: 300)  : int scalar capping the number of iterations attempted if convergence criteria is not met
+       dtype      (default: np.float64)    : numpy dtype for the device copy of the trajectory; np.float32 halves device memory while averages and likelihoods are still accumulated in float64
     Outputs:
        aligned_positions                   : float64 array with dimensions (n_frames, n_atoms, 3) of aligned particle positions
        avg                                 : float64 array with dimensions (n_atoms, 3) of the average structure after alignment
        particle_variance                   : float64 scalar of average particle variance after alignment
     """
+    try:
+        import cupy as cp
+    except ImportError:
+        raise ImportError("align_maximum_likelihood_uniform_gpu requires CuPy")
     # trajectory metadata
     n_frames = traj_positions.shape[0]
     n_atoms = traj_positions.shape[1]
-    n_dim = traj_positions.shape[2]
-    # create numpy array of aligned positions
-    aligned_pos = np.copy(traj_positions).astype(np.float64)
-    # start be removing COG translation
-    for ts in range(n_frames):
-        mu = np.zeros(n_dim)
-        for atom in range(n_atoms):
-            mu += aligned_pos[ts,atom]
-        mu /= n_atoms
-        aligned_pos[ts] -= mu
-    # Initialize average as first frame
-    avg = np.copy(aligned_pos[0]).astype(np.float64)
-    log_lik, var = uniform_kabsch_log_lik(aligned_pos,avg)
+    # upload once in the requested storage precision
+    aligned_pos = cp.asarray(traj_positions, dtype=dtype)
+    # start be removing COG translation; means accumulate in float64
+    aligned_pos -= aligned_pos.mean(axis=1,keepdims=True,dtype=cp.float64)
+    # on-device uniform log likelihood, same math as uniform_kabsch_log_lik;
+    # the sum of squares reduces in float64 regardless of the storage dtype
+    def device_log_lik(x, mu):
+        disp = x - mu
+        ss = float(cp.einsum('fad,fad->', disp, disp, dtype=cp.float64))
+        return _uniform_log_lik_from_ss(ss, n_frames, n_atoms)
+    # Initialize average as first frame; averages stay float64
+    avg = aligned_pos[0].astype(cp.float64)
+    log_lik, var = device_log_lik(aligned_pos,avg)
     # perform iterative alignment and average to converge log likelihood
     log_lik_diff = 10
     step = 1
@@ -250,92 +549,111 @@ def align_maximum_likelihood_uniform(traj_positions,thresh=1E-10, max_steps=300,
         print("Iteration   Log Likelihood     Delta Log Likelihood")
         print("-----------------------------------------------------------------")
     while log_lik_diff > thresh and step < max_steps:
-        # rezero new average
-        new_avg = np.zeros((n_atoms,n_dim),dtype=np.float64)
-        # align trajectory to average and accumulate new average
-        for ts in range(n_frames):
-            aligned_pos[ts] = kabsch_rotate(aligned_pos[ts], avg)
-            new_avg += aligned_pos[ts]
-        # finish average
-        new_avg /= n_frames
-        # compute log likelihood
-        new_log_lik, var = uniform_kabsch_log_lik(aligned_pos,avg)
+        # batched correlation matrices, SVDs and rotations all stay on device
+        correlation_matrices = cp.einsum('fai,aj->fij', aligned_pos, avg)
+        V, S, W_tr = cp.linalg.svd(correlation_matrices)
+        dets = cp.linalg.det(V) * cp.linalg.det(W_tr)
+        V[dets < 0.0, :, -1] *= -1.0
+        rotations = cp.matmul(V, W_tr)
+        aligned_pos = cp.einsum('fai,fij->faj', aligned_pos, rotations.astype(aligned_pos.dtype))
+        new_avg = aligned_pos.mean(axis=0,dtype=cp.float64)
+        # compute log likelihood about the updated average
+        new_log_lik, var = device_log_lik(aligned_pos,new_avg)
         log_lik_diff = np.abs(new_log_lik-log_lik)
         log_lik = new_log_lik
-        # copy new average
-        avg = np.copy(new_avg)
+        avg = new_avg
         step += 1
         if silent == False:
             print(step, log_lik, log_lik_diff)
-            #print("%10d %20.8f %20.8f" % (step, log_lik, log_lik_diff))
-            #print('{10d} {20.8f} {20.8f}'.format(step, log_lik, log_lik_diff))
-            #print('{10d}'.format(step), '{20.8f}'.format(log_lik), '{20.8f}'.format(log_lik_diff))
-    return aligned_pos, avg, var
+    # download only the final result
+    return cp.asnumpy(aligned_pos), cp.asnumpy(avg), var
 
 ###########################################################################################################
 ##################################   Intermediate Covariance Model ########################################
 ###########################################################################################################
 
-@jit(nopython=True)
+# finish the intermediate log likelihood from the accumulated quadratic form
+def _intermediate_log_lik_from_quad(quad, kabsch_weights, n_frames):
+    log_lik = quad + 3 * n_frames * lpdet_inv(kabsch_weights)
+    log_lik *= -0.5
+    return log_lik
+
+# quadratic form and per-particle squared displacements about avg, accumulated
+# together chunk-by-chunk so one scoring sweep feeds both the log likelihood
+# and the next iteration's variances without a full-trajectory temporary
+def _intermediate_stats_cm(aligned_cm, avg, kabsch_weights, chunk=ChunkFrames):
+    # meta data
+    n_atoms = aligned_cm.shape[2]
+    quad = 0.0
+    particle_ss = np.zeros(n_atoms)
+    for start in range(0,aligned_cm.shape[0],chunk):
+        d = aligned_cm[start:start+chunk] - avg
+        d_stacked = d.reshape(-1,n_atoms)
+        quad += np.einsum('ij,ij->',np.dot(d_stacked,kabsch_weights),d_stacked)
+        particle_ss += np.einsum('fda,fda->a',d,d)
+    return quad, particle_ss
+
+# log likelihood from displacements already stacked as (3*n_frames, n_atoms):
+# all quadratic forms in a single gemm followed by an elementwise reduction
+def _intermediate_log_lik_stacked(disp, kabsch_weights, n_frames):
+    quad = np.einsum('ij,ij->',np.dot(disp,kabsch_weights),disp)
+    return _intermediate_log_lik_from_quad(quad, kabsch_weights, n_frames)
+
 def intermediate_kabsch_log_lik(x, mu, kabsch_weights):
     # meta data
     n_frames = x.shape[0]
-    lpdet = lpdet_inv(kabsch_weights) 
-    # compute log Likelihood for all points
-    log_lik = 0.0
-    for i in range(n_frames):
-        #disp = x[i] - mu
-        for j in range(3):
-            disp = x[i,:,j] - mu[:,j]
-            log_lik += np.dot(disp,np.dot(kabsch_weights,disp))
-    log_lik += 3 * n_frames * lpdet
-    log_lik *= -0.5
-    return log_lik
+    n_atoms = x.shape[1]
+    # stack the frame and Cartesian axes
+    disp = (x - mu).transpose(0,2,1).reshape(n_frames*3,n_atoms)
+    return _intermediate_log_lik_stacked(disp, kabsch_weights, n_frames)
 
 
 # compute variance of each particle from a trajectory and average structure
-@jit(nopython=True)
 def particle_variances_from_trajectory(traj_positions, avg):
     # meta data
     n_frames = traj_positions.shape[0]
-    n_atoms = traj_positions.shape[1]
-    # 
+    #
     disp = traj_positions - avg
-    particle_variances = np.zeros(n_atoms,dtype=np.float64)
-    for ts in range(n_frames):
-        for atom in range(n_atoms):
-            particle_variances[atom] += np.dot(disp[ts,atom],disp[ts,atom])
+    # single fused reduction over frames and dimensions for each particle
+    particle_variances = np.einsum('fad,fad->a',disp,disp)
+    particle_variances /= 3*(n_frames-1)
+    return particle_variances
+
+
+# particle variances from a component-major (n_frames, 3, n_atoms) trajectory,
+# accumulated chunk-by-chunk to bound the displacement temporary
+def _particle_variances_cm(aligned_cm, avg, chunk=ChunkFrames):
+    # meta data
+    n_frames = aligned_cm.shape[0]
+    n_atoms = aligned_cm.shape[2]
+    particle_variances = np.zeros(n_atoms)
+    for start in range(0,n_frames,chunk):
+        d = aligned_cm[start:start+chunk] - avg
+        particle_variances += np.einsum('fda,fda->a',d,d)
     particle_variances /= 3*(n_frames-1)
     return particle_variances
 
 
 # Compute the intermediate kabsch weights from variances
-@jit(nopython=True)
+@jit(nopython=True, cache=True)
 def intermediate_kabsch_weights(variances):
-    # meta data
-    n_atoms = variances.shape[0]
     # kasbch weights are inverse of variances
     inverseVariances = np.power(variances,-1)
-    kabsch_weights = np.zeros((n_atoms,n_atoms),dtype=np.float64)
-    # force constant vector to be null space of kabsch weights
+    # force constant vector to be null space of kabsch weights with a single rank-1 update
     wsum = np.sum(inverseVariances)
-    for i in range(n_atoms):
-        # Populate diagonal elements
-        kabsch_weights[i,i] = inverseVariances[i]
-        for j in range(n_atoms):
-            kabsch_weights[i,j] -= inverseVariances[i]*inverseVariances[j]/wsum
+    kabsch_weights = np.diag(inverseVariances) - np.outer(inverseVariances,inverseVariances)/wsum
     # return the weights
     return kabsch_weights
 
 # compute the average structure and covariance from trajectory data
-@jit(nopython=True)
-def align_maximum_likelihood_intermediate(traj_positions,thresh=1E-3,max_steps=300):
+def align_maximum_likelihood_intermediate(traj_positions,thresh=1E-3,max_steps=300, dtype=np.float64):
     """
     Perform maximum likelihood alignment of a trajecotry of particle positions.  The alignment is done with the intermediate covariance model.  This model assumes that particles vary in different, independent, spherical distributions.
     Inputs:
        traj_positions          (required)  : float64 array with dimensions (n_frames, n_atoms, 3) of particle positions
        thresh             (default: 1e-3)  : float64 scalar determining the log likelihood difference deemed to be converged
        max_steps           (default: 300)  : int scalar capping the number of iterations attempted if convergence criteria is not met
+       dtype      (default: np.float64)    : numpy dtype for the working copy of the trajectory; variances and likelihoods are still accumulated in float64
     Outputs:
        aligned_positions                   : float64 array with dimensions (n_frames, n_atoms, 3) of aligned particle positions
        avg                                 : float64 array with dimensions (n_atoms, 3) of the average structure after alignment
@@ -344,70 +662,87 @@ def align_maximum_likelihood_intermediate(traj_positions,thresh=1E-3,max_steps=3
     # trajectory metadata
     n_frames = traj_positions.shape[0]
     n_atoms = traj_positions.shape[1]
-    n_dim = traj_positions.shape[2]
-    # Initialize with uniform alignment
-    aligned_pos, avg = align_maximum_likelihood_uniform(traj_positions,thresh,max_steps,silent=True)[:2]
+    # Initialize with uniform alignment; stay in component-major layout
+    aligned_cm, avg = _align_maximum_likelihood_uniform_cm(traj_positions,thresh,max_steps,True,dtype)[:2]
     # Compute Kabsch Weights
-    particle_variances = particle_variances_from_trajectory(aligned_pos, avg)
+    particle_variances = _particle_variances_cm(aligned_cm, avg)
     kabsch_weights = intermediate_kabsch_weights(particle_variances)
-    log_lik = intermediate_kabsch_log_lik(aligned_pos,avg,kabsch_weights)
+    log_lik = _intermediate_log_lik_from_quad(_intermediate_stats_cm(aligned_cm, avg, kabsch_weights)[0], kabsch_weights, n_frames)
     # perform iterative alignment and average to converge average
     log_lik_diff = 10
     step = 0
     print("Iteration   Log Likelihood     Delta Log Likelihood")
     print("-----------------------------------------------------------------")
     while log_lik_diff > thresh and step < max_steps:
-        # rezero new average
-        new_avg = np.zeros((n_atoms,n_dim),dtype=np.float64)
-        # align trajectory to average and accumulate new average
-        weighted_avg = np.dot(kabsch_weights, avg)
-        for ts in range(n_frames):
-            aligned_pos[ts] = kabsch_rotate(aligned_pos[ts], weighted_avg)
-            new_avg += aligned_pos[ts]
-        # finish average
-        new_avg /= n_frames
+        # align trajectory to weighted average and accumulate new average
+        # kabsch_weights is symmetric so the component-major product is avg @ K
+        weighted_avg = np.dot(avg, kabsch_weights)
+        new_avg = _align_frames_to_target(aligned_cm, weighted_avg)
+        # one chunked sweep about the updated average scores the log likelihood
+        # and accumulates the squared displacements for the new variances
+        quad, particle_ss = _intermediate_stats_cm(aligned_cm, new_avg, kabsch_weights)
         # compute log likelihood
-        new_log_lik = intermediate_kabsch_log_lik(aligned_pos,avg,kabsch_weights)
+        new_log_lik = _intermediate_log_lik_from_quad(quad, kabsch_weights, n_frames)
         log_lik_diff = np.abs(new_log_lik-log_lik)
         log_lik = new_log_lik
         # compute new Kabsch Weights
-        particle_variances = particle_variances_from_trajectory(aligned_pos,new_avg)
+        particle_variances = particle_ss / (3*(n_frames-1))
         kabsch_weights = intermediate_kabsch_weights(particle_variances)
+        # adopt the updated average for the next iteration and the return value
+        avg = new_avg
         step += 1
         print(step, log_lik, log_lik_diff)
         #print("%10d %20.8f %20.8f" % (step, log_lik, log_lik_diff))
         #print('{10d}'.format(step), '{20.8f}'.format(log_lik), '{20.8f}'.format(log_lik_diff))
-    return aligned_pos, avg, particle_variances
+    return np.ascontiguousarray(aligned_cm.transpose(0,2,1)), np.ascontiguousarray(avg.T), particle_variances
 
 
 ###########################################################################################################
 ##################################   Weighted Covariance Model ########################################
 ###########################################################################################################
 
-@jit(nopython=True)
-def weight_kabsch_log_lik(x, mu, precision, lpdet):
-    # meta data
-    n_frames = x.shape[0]
-    # compute log Likelihood for all points
-    log_lik = 0.0
-    for i in range(n_frames):
-        #disp = x[i] - mu
-        for j in range(3):
-            disp = x[i,:,j] - mu[:,j]
-            log_lik += np.dot(disp,np.dot(precision,disp))
-    log_lik += 3 * n_frames * lpdet
+# finish the weighted log likelihood from the accumulated quadratic form
+def _weight_log_lik_from_quad(quad, lpdet, n_frames):
+    log_lik = quad + 3 * n_frames * lpdet
     log_lik *= -0.5
     return log_lik
 
+# factored-precision quadratic form about avg, accumulated chunk-by-chunk over
+# a component-major trajectory
+def _weight_quad_cm(aligned_cm, avg, V_kept, inv_e, chunk=ChunkFrames):
+    # meta data
+    n_atoms = aligned_cm.shape[2]
+    quad = 0.0
+    for start in range(0,aligned_cm.shape[0],chunk):
+        proj = np.dot((aligned_cm[start:start+chunk] - avg).reshape(-1,n_atoms), V_kept)
+        quad += np.einsum('ij,ij,j->',proj,proj,inv_e)
+    return quad
+
+# log likelihood from displacements already stacked as (3*n_frames, n_atoms),
+# with the precision in factored eigen form: quadratic forms become O(N*rank)
+# projections instead of O(N^2) matvecs
+def _weight_log_lik_stacked(disp, V_kept, inv_e, lpdet, n_frames):
+    proj = np.dot(disp,V_kept)
+    quad = np.einsum('ij,ij,j->',proj,proj,inv_e)
+    return _weight_log_lik_from_quad(quad, lpdet, n_frames)
+
+def weight_kabsch_log_lik(x, mu, V_kept, inv_e, lpdet):
+    # meta data
+    n_frames = x.shape[0]
+    n_atoms = x.shape[1]
+    # stack the frame and Cartesian axes
+    disp = (x - mu).transpose(0,2,1).reshape(n_frames*3,n_atoms)
+    return _weight_log_lik_stacked(disp, V_kept, inv_e, lpdet, n_frames)
+
 # Perform weighted maximum likelihood trajectory alignment
-@jit(nopython=True)
-def align_maximum_likelihood_weighted(traj_positions,thresh=1E-3,max_steps=300):
+def align_maximum_likelihood_weighted(traj_positions,thresh=1E-3,max_steps=300, dtype=np.float64):
     """
     Perform maximum likelihood alignment of a trajecotry of particle positions.  The alignment is done with the weighted covariance model.  This model assumes that particles vary in different, coupled, spherical distributions.
     Inputs:
        traj_positions          (required)  : float64 array with dimensions (n_frames, n_atoms, 3) of particle positions
        thresh             (default: 1e-3)  : float64 scalar determining the log likelihood difference deemed to be converged
        max_steps           (default: 300)  : int scalar capping the number of iterations attempted if convergence criteria is not met
+       dtype      (default: np.float64)    : numpy dtype for the working copy of the trajectory; covariances and likelihoods are still accumulated in float64
     Outputs:
        aligned_positions                   : float64 array with dimensions (n_frames, n_atoms, 3) of aligned particle positions
        avg                                 : float64 array with dimensions (n_atoms, 3) of the average structure after alignment
@@ -416,36 +751,30 @@ def align_maximum_likelihood_weighted(traj_positions,thresh=1E-3,max_steps=300):
     # trajectory metadata
     n_frames = traj_positions.shape[0]
     n_atoms = traj_positions.shape[1]
-    n_dim = traj_positions.shape[2]
-    # Initialize with uniform weighted Kabsch
-    aligned_pos, avg = align_maximum_likelihood_uniform(traj_positions,thresh,max_steps,silent=True)[:2]
-    # compute NxN covar
-    covar = covar_NxN_from_traj(aligned_pos-avg)
-    # determine precision and pseudo determinant 
-    lpdet, precision, rank = pseudo_lpdet_inv(covar)
+    # Initialize with uniform weighted Kabsch; stay in component-major layout
+    aligned_cm, avg = _align_maximum_likelihood_uniform_cm(traj_positions,thresh,max_steps,True,dtype)[:2]
+    # compute NxN covar in chunked sweeps; no full-trajectory temporary
+    covar = _covar_NxN_chunked(aligned_cm, avg)
+    # determine factored precision and pseudo determinant
+    lpdet, V_kept, inv_e, rank = pseudo_lpdet_eig(covar)
     # compute log likelihood
-    log_lik = weight_kabsch_log_lik(aligned_pos, avg, precision, lpdet)
+    log_lik = _weight_log_lik_from_quad(_weight_quad_cm(aligned_cm, avg, V_kept, inv_e), lpdet, n_frames)
     # perform iterative alignment and average to converge average
     log_lik_diff = 10+thresh
     step = 0
     print("Iteration   Log Likelihood     Delta Log Likelihood")
     print("-----------------------------------------------------------------")
     while log_lik_diff > thresh and step < max_steps:
-        # rezero new average
-        new_avg = np.zeros((n_atoms,n_dim),dtype=np.float64)
-        # align trajectory to average and accumulate new average
-        weighted_avg = np.dot(precision,avg)
-        for ts in range(n_frames):
-            aligned_pos[ts] = kabsch_rotate(aligned_pos[ts], weighted_avg)
-            new_avg += aligned_pos[ts]
-        # finish average
-        new_avg /= n_frames
+        # align trajectory to weighted average and accumulate new average
+        # precision @ avg without forming precision: project, scale, expand
+        weighted_avg = np.dot(np.dot(avg, V_kept) * inv_e, V_kept.T)
+        new_avg = _align_frames_to_target(aligned_cm, weighted_avg)
         # compute new Kabsch Weights
-        covar = covar_NxN_from_traj(aligned_pos-new_avg)
-        # determine precision and pseudo determinant 
-        lpdet, precision, rank = pseudo_lpdet_inv(covar)
+        covar = _covar_NxN_chunked(aligned_cm, new_avg)
+        # determine factored precision and pseudo determinant
+        lpdet, V_kept, inv_e, rank = pseudo_lpdet_eig(covar)
         # compute log likelihood
-        new_log_lik = weight_kabsch_log_lik(aligned_pos, new_avg, precision, lpdet)
+        new_log_lik = _weight_log_lik_from_quad(_weight_quad_cm(aligned_cm, new_avg, V_kept, inv_e), lpdet, n_frames)
         log_lik_diff = np.abs(new_log_lik-log_lik)
         log_lik = new_log_lik
         avg = np.copy(new_avg)
@@ -454,34 +783,66 @@ def align_maximum_likelihood_weighted(traj_positions,thresh=1E-3,max_steps=300):
         #print("%10d %20.8f %20.8f" % (step, log_lik, log_lik_diff))
         #print('{10d} {20.8f} {20.8f}'.format(step, log_lik, log_lik_diff))
         #print('{10d}'.format(step), '{20.8f}'.format(log_lik), '{20.8f}'.format(log_lik_diff))
-    return aligned_pos, avg, np.linalg.pinv(precision, rcond=1e-10)
+    # reconstruct the covariance from the kept eigenpairs (pseudo inverse of precision)
+    return np.ascontiguousarray(aligned_cm.transpose(0,2,1)), np.ascontiguousarray(avg.T), np.dot(V_kept/inv_e, V_kept.T)
 
 ######################################  Non-iterative alignment protocols ##############################################
 
 
-# align trajectory data to a reference structure
-@jit(nopython=True)
-def align_traj_to_ref_weighted_kabsch(traj_positions,ref, covar):
-    # trajectory metadata
+@jit(nopython=True, parallel=True, cache=True)
+def _rotate_frames_to_ref_weighted(traj_positions, aligned_positions, ref, kabsch_weights):
     n_frames = traj_positions.shape[0]
-    # kabsch weights
-    kabsch_weights = np.linalg.pinv(covar,rcond=1e-10)
-    # create numpy array of aligned positions
-    aligned_positions = np.copy(traj_positions)
-    for ts in range(n_frames):
+    for ts in prange(n_frames):
         # align positions based on weighted Kabsch
-        aligned_positions[ts] = weight_kabsch_rotate(aligned_positions[ts], ref, kabsch_weights)
+        aligned_positions[ts] = weight_kabsch_rotate(traj_positions[ts], ref, kabsch_weights)
+
+@jit(nopython=True, parallel=True, cache=True)
+def _rotate_frames_to_ref_uniform(traj_positions, aligned_positions, ref):
+    n_frames = traj_positions.shape[0]
+    for ts in prange(n_frames):
+        aligned_positions[ts] = kabsch_rotate(traj_positions[ts], ref)
+
+# align trajectory data to a reference structure
+def align_traj_to_ref_weighted_kabsch(traj_positions, ref, covar, kabsch_weights=None, inplace=False):
+    # kabsch weights: reuse the caller's if already computed
+    if kabsch_weights is None:
+        kabsch_weights = np.linalg.pinv(covar,rcond=1e-10)
+    # with inplace=True the trajectory is rotated in its own storage, skipping the
+    # full-trajectory allocation and copy
+    aligned_positions = traj_positions if inplace else np.empty_like(traj_positions)
+    _rotate_frames_to_ref_weighted(traj_positions, aligned_positions, ref, kabsch_weights)
     return aligned_positions
 
 # align trajectory data to a reference structure
-@jit(nopython=True)
-def align_traj_to_ref_uniform_kabsch(traj_positions,ref):
-    # trajectory metadata
-    n_frames = traj_positions.shape[0]
-    # create numpy array of aligned positions
-    aligned_positions = np.copy(traj_positions)
-    for ts in range(n_frames):
-        # make sure positions are centered
-        aligned_positions[ts] = kabsch_rotate(aligned_positions[ts], ref)
+def align_traj_to_ref_uniform_kabsch(traj_positions, ref, inplace=False):
+    aligned_positions = traj_positions if inplace else np.empty_like(traj_positions)
+    _rotate_frames_to_ref_uniform(traj_positions, aligned_positions, ref)
     return aligned_positions
 
+
+###########################################################################################################
+##################################   Ahead-of-time compiled kernels  ######################################
+###########################################################################################################
+
+# keep the dispatchers reachable for build_aot.py even when the extension is loaded
+_jit_sample_variance = sample_variance
+_jit_rmsd_kabsch = rmsd_kabsch
+_jit_weight_kabsch_rmsd = weight_kabsch_rmsd
+_jit_weight_kabsch_dist_align = weight_kabsch_dist_align
+_jit_weight_kabsch_dist_lowrank = weight_kabsch_dist_lowrank
+_jit_qcp_rotate = qcp_rotate
+
+# prefer the precompiled float64 kernels built by build_aot.py; they carry no JIT
+# cost at all.  Kernels called from inside other jitted functions (kabsch_rotate,
+# weight_kabsch_rotate, weight_kabsch_dist, qcp_rotation) keep their dispatchers
+# so the nopython call graph still links against them.
+try:
+    import traj_tools_aot as _aot
+    sample_variance = _aot.sample_variance
+    rmsd_kabsch = _aot.rmsd_kabsch
+    weight_kabsch_rmsd = _aot.weight_kabsch_rmsd
+    weight_kabsch_dist_align = _aot.weight_kabsch_dist_align
+    weight_kabsch_dist_lowrank = _aot.weight_kabsch_dist_lowrank
+    qcp_rotate = _aot.qcp_rotate
+except ImportError:
+    pass